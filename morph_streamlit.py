@@ -1,97 +1,68 @@
 # Run:  streamlit run streamlit_app.py
 import streamlit as st
-from typing import Dict, Any, Tuple, List, Optional
+from typing import TYPE_CHECKING, Dict, Tuple, List
 import json
+import math
 import os
-import pandas as pd
-import io
-from PIL import Image
+import sys
+from collections import namedtuple
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from itertools import chain
+from operator import attrgetter
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 st.set_page_config(page_title="LCZ Classifier", page_icon="", layout="wide")
 
 CUR_DIR = os.path.dirname(os.path.abspath(__file__))
-print(CUR_DIR)
+
+INF = float("inf")
+NAN = float("nan")
+NA_BOUNDS = (-INF, INF, False, False, True)
+
+# Bounds are normalized to (lo, hi, strict_lo, strict_hi, is_na) with open
+# ends filled by -inf/+inf, so every spec kind is checked the same way.
+def _ge(v: str): return (float(v), INF, False, False, False)
+def _le(v: str): return (-INF, float(v), False, False, False)
+def _gt(v: str): return (float(v), INF, True, False, False)
+def _lt(v: str): return (-INF, float(v), False, True, False)
+
+_SPEC_NORM = str.maketrans({"–": "-", "—": "-", "≥": ">=", "≤": "<="})
+_PREFIX2 = {">=": _ge, "<=": _le}
+_PREFIX1 = {">": _gt, "<": _lt}
 
 def parse_bounds(spec: str):
     if spec is None:
         return None
     s = str(spec).strip()
     if s == "" or s == "-" or s.lower() in {"na", "n/a", "none"}:
-        return (None, None, "na")
-    s = s.replace("–", "-").replace("—", "-").replace("≥", ">=").replace("≤", "<=")
-    if s.startswith(">="):
-        return (float(s[2:]), None, "ge")
-    if s.startswith("<="):
-        return (None, float(s[2:]), "le")
-    if s.startswith(">"):
-        return (float(s[1:]), None, "gt")
-    if s.startswith("<"):
-        return (None, float(s[1:]), "lt")
+        return NA_BOUNDS
+    s = s.translate(_SPEC_NORM)
+    fn = _PREFIX2.get(s[:2])
+    if fn is not None:
+        return fn(s[2:])
+    fn = _PREFIX1.get(s[:1])
+    if fn is not None:
+        return fn(s[1:])
     if "-" in s:
         parts = [p.strip() for p in s.split("-")]
         if len(parts) == 2 and parts[0] and parts[1]:
             try:
-                return (float(parts[0]), float(parts[1]), "range")
-            except:
+                return (float(parts[0]), float(parts[1]), False, False, False)
+            except ValueError:
                 pass
     try:
         val = float(s)
-        return (val, val, "eq")
-    except:
-        return None
-
-def value_in_spec(value: Optional[float], spec: str) -> Optional[bool]:
-    pr = parse_bounds(spec)
-    if pr is None:
+        return (val, val, False, False, False)
+    except (TypeError, ValueError):
         return None
-    lo, hi, kind = pr
-    if value is None:
-        return False if kind != "na" else True
-    if kind == "na":
-        return True
-    if kind == "range":
-        return (lo is None or value >= lo) and (hi is None or value <= hi)
-    if kind == "gt":
-        return value > (lo if lo is not None else float("-inf"))
-    if kind == "lt":
-        return value < (hi if hi is not None else float("inf"))
-    if kind == "ge":
-        return value >= (lo if lo is not None else float("-inf"))
-    if kind == "le":
-        return value <= (hi if hi is not None else float("inf"))
-    if kind == "eq":
-        return abs(value - (lo if lo is not None else value)) < 1e-9
-    return None
-
-def range_distance(value: Optional[float], spec: str) -> float:
-    pr = parse_bounds(spec)
-    if pr is None:
-        return 0.0
-    lo, hi, kind = pr
-    if value is None:
-        return 0.5
-    if kind == "na":
-        return 0.0
-    if kind in {"gt","ge"}:
-        bound = lo if lo is not None else float("-inf")
-        return max(0.0, bound - value)
-    if kind in {"lt","le"}:
-        bound = hi if hi is not None else float("inf")
-        return max(0.0, value - bound)
-    if kind == "eq":
-        target = lo if lo is not None else value
-        return abs(value - target)
-    if kind == "range":
-        lo_b = lo if lo is not None else float("-inf")
-        hi_b = hi if hi is not None else float("inf")
-        if lo_b <= value <= hi_b:
-            return 0.0
-        if value < lo_b:
-            return lo_b - value
-        return value - hi_b
-    return 0.0
 
 def to_num(val):
+    if isinstance(val, (int, float)):
+        return float(val)
     try:
         if val is None:
             return None
@@ -99,9 +70,35 @@ def to_num(val):
         if s == "":
             return None
         return float(s)
-    except:
+    except (TypeError, ValueError):
         return None
 
+@dataclass(frozen=True, slots=True)
+class FrozenParams:
+    SVF: float = NAN
+    SCR: float = NAN
+    FAR: float = NAN
+    BSF: float = NAN
+    ISF: float = NAN
+    PSF: float = NAN
+    BH: float = NAN
+    BHD: float = NAN
+    BHV: float = NAN
+    AL: float = NAN
+    TR: float = NAN
+    TH: str = ""
+
+    @classmethod
+    def from_mapping(cls, params) -> "FrozenParams":
+        get = params.get
+        nums = [to_num(get(p)) for p in SPEC_PARAMS]
+        return cls(*[NAN if v is None else v for v in nums], get("TH") or "")
+
+PARAM_NAMES = tuple(f.name for f in fields(FrozenParams))
+# from_mapping fills the numeric fields positionally and passes TH last
+assert PARAM_NAMES[-1] == "TH"
+SPEC_PARAMS = PARAM_NAMES[:-1]
+
 DEFAULTS = {
     "SVF": 0.85, "SCR": 0.20, "FAR": 0.90,
     "BSF": 25.0, "ISF": 45.0, "PSF": 15.0,
@@ -114,26 +111,24 @@ def init_defaults():
         if k not in st.session_state:
             st.session_state[k] = v
 
+# Widgets inside tabs that are not rendered on a run would have their state
+# dropped by Streamlit; re-assigning the keys keeps selections across tab switches.
+TAB_WIDGET_DEFAULTS = {
+    "lcz_query": "", "lcz_groups": ["All"],
+    "lcz_show_images": True, "lcz_compact": True, "lcz_show_table": False,
+    "show_stacked_lcz": True, "show_stacked_group": True, "show_proportions": False,
+    "show_uapa_grouped": False, "show_overall_accuracy": False,
+}
 
-def _epsilon_for(param: str) -> float:
-    eps = {"SVF":0.01,"SCR":0.05,"FAR":0.05,"AL":0.01,
-           "BSF":1.0,"ISF":1.0,"PSF":1.0,"BH":0.5,"BHD":0.5,"BHV":5.0,"TR":0.5}
-    return eps.get(param, 0.1)
+def keep_tab_widget_state():
+    for k, v in TAB_WIDGET_DEFAULTS.items():
+        st.session_state[k] = st.session_state.get(k, v)
+    if "district" in st.session_state:
+        st.session_state["district"] = st.session_state["district"]
 
-def suggest_value_from_spec(param: str, spec: str):
-    pr = parse_bounds(spec)
-    if pr is None: return None
-    lo, hi, kind = pr
-    eps = _epsilon_for(param)
-    if kind == "na": return None
-    if kind == "eq": return lo
-    if kind == "range":
-        if lo is None and hi is not None: return max(0.0, hi - eps)
-        if hi is None and lo is not None: return lo + eps
-        return (lo + hi) / 2.0
-    if kind in {"ge","gt"}: return (lo if lo is not None else 0.0) + eps
-    if kind in {"le","lt"}: return max(0.0, (hi if hi is not None else 0.0) - eps)
-    return lo
+
+PRESET_EPS = {"SVF":0.01,"SCR":0.05,"FAR":0.05,"AL":0.01,
+              "BSF":1.0,"ISF":1.0,"PSF":1.0,"BH":0.5,"BHD":0.5,"BHV":5.0,"TR":0.5}
 
 
 PRESET_OVERRIDES = {
@@ -155,35 +150,13 @@ PRESET_OVERRIDES = {
     "G":  {"BSF": 0.0,  "ISF": 0.0, "AL": 0.06, "TR": 1.0},
 }
 
-def fill_preset_from_lcz(lcz_code: str):
-    spec = LCZ_TABLE.get(lcz_code, {})
-    
-    for p in ["SVF","SCR","FAR","BSF","ISF","PSF","BH","BHD","BHV","AL","TR"]:
-        if p in spec:
-            val = suggest_value_from_spec(p, spec[p])
-            if val is not None:
-                st.session_state[p] = float(val)
-    if "TH" in spec and spec["TH"] not in ("-", "", None):
-        st.session_state["TH"] = spec["TH"]
-
-    if lcz_code in PRESET_OVERRIDES:
-        for k, v in PRESET_OVERRIDES[lcz_code].items():
-            st.session_state[k] = v
-
 def apply_preset_to_session(lcz_code: str):
-    spec = LCZ_TABLE.get(lcz_code, {})
-    
-    for p in ["SVF","SCR","FAR","BSF","ISF","PSF","BH","BHD","BHV","AL","TR"]:
-        if p in spec:
-            v = suggest_value_from_spec(p, spec[p])
-            if v is not None:
-                st.session_state[p] = float(v)
-    
-    if "TH" in spec and spec["TH"] not in ("-","",None):
-        st.session_state["TH"] = spec["TH"]
-    
-    for k, v in PRESET_OVERRIDES.get(lcz_code, {}).items():
-        st.session_state[k] = v
+    values = _preset_values(lcz_code) if lcz_code in LCZ_IDX else {}
+    th = LCZ_TABLE.get(lcz_code, {}).get("TH")
+    if th not in ("-", "", None):
+        values["TH"] = th
+    values.update(PRESET_OVERRIDES.get(lcz_code, {}))
+    st.session_state.update(values)
 
 
 LCZ_TABLE: Dict[str, Dict[str, str]] = {
@@ -205,6 +178,31 @@ LCZ_TABLE: Dict[str, Dict[str, str]] = {
     "G":  {"SVF":">0.9","SCR":"<0.1","FAR":"-","BSF":"<10","ISF":"<10","PSF":">90","BH":"-","BHD":"-","BHV":"-","AL":"0.02-0.10","TH":"-","TR":"1"},
 }
 
+def _build_spec_arrays(table: Dict[str, Dict[str, str]]):
+    bounds = np.array([[parse_bounds(spec[p]) or NA_BOUNDS for p in SPEC_PARAMS]
+                       for spec in table.values()], dtype=float)
+    lo, hi, strict_lo, strict_hi, is_na = np.moveaxis(bounds, -1, 0)
+    return lo, hi, strict_lo.astype(bool), strict_hi.astype(bool), is_na.astype(bool)
+
+LCZ_CODES = [sys.intern(code) for code in LCZ_TABLE]
+LCZ_IDX = {code: i for i, code in enumerate(LCZ_CODES)}
+# Position of each code in string order, the final tie-break in best_matches
+LCZ_CODE_RANK = np.argsort(np.argsort(LCZ_CODES))
+SPEC_LO, SPEC_HI, SPEC_STRICT_LO, SPEC_STRICT_HI, SPEC_NA = _build_spec_arrays(LCZ_TABLE)
+SPEC_TH = [str(spec["TH"]).lower() for spec in LCZ_TABLE.values()]
+SPEC_EPS = np.array([PRESET_EPS[p] for p in SPEC_PARAMS])
+
+def _preset_values(lcz_code: str) -> Dict[str, float]:
+    row = LCZ_IDX[lcz_code]
+    lo, hi = SPEC_LO[row], SPEC_HI[row]
+    with np.errstate(invalid="ignore"):
+        vals = np.select(
+            [lo == hi, hi == INF, lo == -INF],
+            [lo, lo + SPEC_EPS, np.maximum(0.0, hi - SPEC_EPS)],
+            default=(lo + hi) / 2.0,
+        )
+    return {p: float(v) for p, v, na in zip(SPEC_PARAMS, vals, SPEC_NA[row]) if not na}
+
 LCZ_DEFINITIONS = {
     "1": {
         "type": "Compact high-rise",
@@ -341,7 +339,10 @@ LCZ_SUMMARY = [
      "Social":"Water supply, recreation, but flood risks if unmanaged."}
 ]
 
-df_summary = pd.DataFrame(LCZ_SUMMARY)
+@st.cache_resource
+def _summary_df():
+    import pandas as pd
+    return pd.DataFrame(LCZ_SUMMARY).set_index("LCZ")
 
 
 LCZ_IMAGES = {
@@ -364,34 +365,47 @@ LCZ_IMAGES = {
     "G": os.path.join(CUR_DIR, "images", "lczg.png"),
 }
 
+LCZRecord = namedtuple("LCZRecord", "type definition image")
 
+LCZ_DB: Dict[str, LCZRecord] = {
+    code: LCZRecord(meta["type"], meta["definition"], LCZ_IMAGES.get(code))
+    for code, meta in LCZ_DEFINITIONS.items()
+}
+
+@st.cache_resource
+def _load_lcz_image(path: str) -> bytes:
+    # the encoded PNG is served as is, so st.image does not re-encode it
+    with open(path, "rb") as f:
+        return f.read()
 
 
-def score_class(params: Dict[str, Any], lcz: str):
-    spec = LCZ_TABLE[lcz]
-    hits = 0
-    dist = 0.0
-    for k, spec_str in spec.items():
-        if k == "TH":
-            th = params.get("TH")
-            if th and str(spec_str).lower() in str(th).lower():
-                hits += 1
-            continue
-        val = to_num(params.get(k))
-        inside = value_in_spec(val, spec_str)
-        if inside is True: hits += 1
-        dist += range_distance(val, spec_str)
-    return hits, dist
 
-def best_matches(params: Dict[str, Any], candidates=None, topk=3):
+
+_spec_values = attrgetter(*SPEC_PARAMS)
+
+def score_classes(fp: FrozenParams) -> Tuple[np.ndarray, np.ndarray]:
+    vals = np.array(_spec_values(fp), dtype=float)
+    with np.errstate(invalid="ignore"):
+        lo_ok = np.where(SPEC_STRICT_LO, vals > SPEC_LO, vals >= SPEC_LO)
+        hi_ok = np.where(SPEC_STRICT_HI, vals < SPEC_HI, vals <= SPEC_HI)
+        dist = np.maximum(0.0, np.maximum(SPEC_LO - vals, vals - SPEC_HI))
+    inside = SPEC_NA | (lo_ok & hi_ok)
+    dist = np.where(np.isnan(vals), 0.5, dist)
+    hits = inside.sum(axis=1)
+    th = fp.TH
+    if th:
+        th_l = str(th).lower()
+        hits = hits + np.fromiter((t in th_l for t in SPEC_TH), dtype=int, count=len(SPEC_TH))
+    return hits, dist.sum(axis=1)
+
+def best_matches(fp: FrozenParams, candidates=None, topk=3):
+    hits, dist = score_classes(fp)
     if candidates is None:
-        candidates = list(LCZ_TABLE.keys())
-    scored = []
-    for l in candidates:
-        h, d = score_class(params, l)
-        scored.append((l, h, d))
-    scored.sort(key=lambda x: (-x[1], x[2], x[0]))
-    return scored[:topk]
+        idx = np.arange(len(LCZ_CODES))
+    else:
+        idx = np.fromiter((LCZ_IDX[l] for l in candidates), dtype=int, count=len(candidates))
+    order = idx[np.lexsort((LCZ_CODE_RANK[idx], dist[idx], -hits[idx]))]
+    return [(LCZ_CODES[i], int(hits[i]), float(dist[i])) for i in order[:topk]]
 
 
 
@@ -451,27 +465,56 @@ def prefer_water_with_AL(code: str | None, AL: float | None, TR: float | None) -
 
 
 
-def classify_lcz(params: dict) -> dict:
-    res = classify_flow(params)
+@lru_cache(maxsize=256)
+def classify_lcz(fp: FrozenParams) -> dict:
+    res = classify_flow(fp)
     lcz = res["lcz"]
 
-    res["type"] = LCZ_DEFINITIONS.get(lcz, {}).get("type", "Unknown")
-    res["definition"] = LCZ_DEFINITIONS.get(lcz, {}).get("definition", "")
-    res["image"] = LCZ_IMAGES.get(lcz, None)
+    rec = LCZ_DB.get(lcz)
+    res["type"] = rec.type if rec else "Unknown"
+    res["definition"] = rec.definition if rec else ""
+    res["image"] = rec.image if rec else None
 
     return res
 
 
-def classify_flow(params: Dict[str, Any]):
-    BSF = to_num(params.get("BSF"))
-    ISF = to_num(params.get("ISF"))
-    SVF = to_num(params.get("SVF"))
-    BH  = to_num(params.get("BH"))
-    BHD = to_num(params.get("BHD"))
-    BHV = to_num(params.get("BHV"))
-    SCR = to_num(params.get("SCR"))
-    FAR = to_num(params.get("FAR"))
-    PSF = to_num(params.get("PSF"))
+_Leaf = namedtuple("_Leaf", "code trace label")
+_Fallback = namedtuple("_Fallback", "candidates label")
+_MIDRISE = "midrise"
+_LOWRISE = "lowrise"
+
+def _bh_bucket(BH: float) -> int:
+    if math.isnan(BH):
+        return 0
+    return 1 if BH < 10 else (2 if BH < 25 else 3)
+
+# Built-up branch indexed by [BSF >= 40][_bh_bucket(BH)]; each row is
+# (node, trace, edge label, cells for BH missing / <10 / 10-25 / >=25).
+_BUILT_TABLE = (
+    ("bsf20to40", "20% ≤ BSF < 40 (or missing high) → {4,5,6,8,8B}", "20≤BSF<40", (
+        _Fallback(("4","5","6","8","8B"), "best-match (BH missing)"),
+        _LOWRISE,
+        _Leaf("5", "10 ≤ BH < 25 ⇒ LCZ-5", "10≤BH<25"),
+        _Leaf("4", "BH ≥ 25 ⇒ LCZ-4", "BH≥25"),
+    )),
+    ("bsf40", "BSF ≥ 40 → {1,2,3,34,35}", "BSF≥40", (
+        _Fallback(("1","2","3","34","35"), "best-match (BH missing)"),
+        _Leaf("3", "BH < 10 ⇒ LCZ-3", "BH<10"),
+        _MIDRISE,
+        _Leaf("1", "BH ≥ 25 ⇒ LCZ-1", "BH≥25"),
+    )),
+)
+
+def classify_flow(fp: FrozenParams):
+    BSF = fp.BSF
+    ISF = fp.ISF
+    SVF = fp.SVF
+    BH  = fp.BH
+    BHD = fp.BHD
+    BHV = fp.BHV
+    SCR = fp.SCR
+    FAR = fp.FAR
+    PSF = fp.PSF
 
     trace: List[str] = []
     nodes = set()
@@ -481,110 +524,93 @@ def classify_flow(params: Dict[str, Any]):
         nodes.add(frm); nodes.add(to); edges.append((frm, to, label))
 
     nodes.add("start")
-    built = (BSF is not None and BSF >= 10) or (ISF is not None and ISF >= 10)
+    built = BSF >= 10 or ISF >= 10
     if built:
         trace.append("Built-up (BSF ≥10 or ISF ≥10)")
         mark("start", "built", "BSF≥10 or ISF≥10")
 
-        if (BSF is not None and BSF < 20) and (SVF is not None and SVF > 0.8):
+        if BSF < 20 and SVF > 0.8:
             trace.append("BSF < 20 and SVF > 0.8 ⇒ LCZ-9")
             mark("built", "lcz9", "BSF<20 & SVF>0.8")
-            return {"lcz":"9","trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":best_matches(params)}
-
-        if BSF is not None and BSF >= 40:
-            trace.append("BSF ≥ 40 → {1,2,3,34,35}")
-            mark("built", "bsf40", "BSF≥40")
-            if BH is not None:
-                if BH >= 25:
-                    trace.append("BH ≥ 25 ⇒ LCZ-1")
-                    mark("bsf40", "lcz1", "BH≥25")
-                    return {"lcz":"1","trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":best_matches(params)}
-                elif 10 <= BH < 25:
-
-                    trace.append("Decide among LCZ-2 / LCZ-34 / LCZ-35 using BHD and BHV")
-                    mark("bsf40", "midrise123435", "10≤BH<25")
-
-                    if BHD is not None and BHD < 9:
-                        trace.append(f"BHD={BHD} < 9 ⇒ LCZ-2")
-                        mark("midrise123435", "lcz2", "BHD<9")
-                        return {"lcz": "2", "trace": trace, "nodes": list(nodes), "edges": edges,
-                                "alternatives": best_matches(params, ["34","35"], topk=2)}
-
-                    if BHV is not None and BHV > 145:
-                        trace.append(f"BHV={BHV} > 145 ⇒ LCZ-34")
-                        mark("midrise123435", "lcz34", "BHV>145")
-                        return {"lcz": "34", "trace": trace, "nodes": list(nodes), "edges": edges,
-                                "alternatives": best_matches(params, ["2","35"], topk=2)}
-
-                    if BHV is not None:
-                        trace.append(f"BHV={BHV} ≤ 145 ⇒ LCZ-35")
-                        mark("midrise123435", "lcz35", "BHV≤145")
-                        return {"lcz": "35", "trace": trace, "nodes": list(nodes), "edges": edges,
-                                "alternatives": best_matches(params, ["2","34"], topk=2)}
-
-                    trace.append("BHD/BHV missing ⇒ fallback table scoring among {2,34,35}")
-                    winner = best_matches(params, ["2","34","35"], topk=3)
-                    mark("midrise123435", f"lcz{winner[0][0]}", "table-fallback")
-                    return {"lcz": winner[0][0], "trace": trace, "nodes": list(nodes), "edges": edges,
-                            "alternatives": winner}
+            return {"lcz":"9","trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":best_matches(fp)}
+
+        node, branch_trace, branch_label, row = _BUILT_TABLE[BSF >= 40]
+        trace.append(branch_trace)
+        mark("built", node, branch_label)
+        cell = row[_bh_bucket(BH)]
+
+        if isinstance(cell, _Leaf):
+            trace.append(cell.trace)
+            mark(node, f"lcz{cell.code}", cell.label)
+            return {"lcz":cell.code,"trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":best_matches(fp)}
+
+        if isinstance(cell, _Fallback):
+            winner = best_matches(fp, cell.candidates, topk=3)
+            mark(node, f"lcz{winner[0][0]}", cell.label)
+            return {"lcz":winner[0][0],"trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":winner}
+
+        if cell is _MIDRISE:
+            trace.append("Decide among LCZ-2 / LCZ-34 / LCZ-35 using BHD and BHV")
+            mark("bsf40", "midrise123435", "10≤BH<25")
+
+            if BHD < 9:
+                trace.append(f"BHD={BHD} < 9 ⇒ LCZ-2")
+                mark("midrise123435", "lcz2", "BHD<9")
+                return {"lcz": "2", "trace": trace, "nodes": list(nodes), "edges": edges,
+                        "alternatives": best_matches(fp, ["34","35"], topk=2)}
+
+            if BHV > 145:
+                trace.append(f"BHV={BHV} > 145 ⇒ LCZ-34")
+                mark("midrise123435", "lcz34", "BHV>145")
+                return {"lcz": "34", "trace": trace, "nodes": list(nodes), "edges": edges,
+                        "alternatives": best_matches(fp, ["2","35"], topk=2)}
+
+            if not math.isnan(BHV):
+                trace.append(f"BHV={BHV} ≤ 145 ⇒ LCZ-35")
+                mark("midrise123435", "lcz35", "BHV≤145")
+                return {"lcz": "35", "trace": trace, "nodes": list(nodes), "edges": edges,
+                        "alternatives": best_matches(fp, ["2","34"], topk=2)}
+
+            trace.append("BHD/BHV missing ⇒ fallback table scoring among {2,34,35}")
+            winner = best_matches(fp, ["2","34","35"], topk=3)
+            mark("midrise123435", f"lcz{winner[0][0]}", "table-fallback")
+            return {"lcz": winner[0][0], "trace": trace, "nodes": list(nodes), "edges": edges,
+                    "alternatives": winner}
+
+        # _LOWRISE
+        trace.append("BH < 10 ⇒ decide with SCR & FAR")
+        mark("bsf20to40", "lowrise_branch", "BH<10")
+        if not (math.isnan(SCR) or math.isnan(FAR)):
+            if (0.3 <= SCR <= 0.75 and FAR <= 0.3):
+                trace.append("0.3 ≤ SCR ≤ 0.75 and FAR ≤ 0.3 ⇒ LCZ-6")
+                mark("lowrise_branch", "lcz6", "SCR/FAR rule")
+                return {"lcz":"6","trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":best_matches(fp)}
+            elif (0.1 <= SCR < 0.3 and FAR > 0.3):
+                if PSF < 10:
+                    trace.append("PSF < 10 ⇒ LCZ-8")
+                    mark("lowrise_branch", "lcz8", "PSF<10")
+                    return {"lcz":"8","trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":best_matches(fp)}
                 else:
-                    trace.append("BH < 10 ⇒ LCZ-3")
-                    mark("bsf40", "lcz3", "BH<10")
-                    return {"lcz":"3","trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":best_matches(params)}
+                    trace.append("PSF ≥ 10 ⇒ LCZ-8B")
+                    mark("lowrise_branch", "lcz8B", "PSF≥10")
+                    return {"lcz":"8B","trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":best_matches(fp)}
             else:
-                winner = best_matches(params, ["1","2","3","34","35"], topk=3)
-                mark("bsf40", f"lcz{winner[0][0]}", "best-match (BH missing)")
+                winner = best_matches(fp, ["6","8","8B"], topk=3)
+                mark("lowrise_branch", f"lcz{winner[0][0]}", "best-match")
                 return {"lcz":winner[0][0],"trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":winner}
         else:
-            trace.append("20% ≤ BSF < 40 (or missing high) → {4,5,6,8,8B}")
-            mark("built", "bsf20to40", "20≤BSF<40")
-            if BH is not None:
-                if BH >= 25:
-                    trace.append("BH ≥ 25 ⇒ LCZ-4")
-                    mark("bsf20to40", "lcz4", "BH≥25")
-                    return {"lcz":"4","trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":best_matches(params)}
-                elif 10 <= BH < 25:
-                    trace.append("10 ≤ BH < 25 ⇒ LCZ-5")
-                    mark("bsf20to40", "lcz5", "10≤BH<25")
-                    return {"lcz":"5","trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":best_matches(params)}
-                else:
-                    trace.append("BH < 10 ⇒ decide with SCR & FAR")
-                    mark("bsf20to40", "lowrise_branch", "BH<10")
-                    if SCR is not None and FAR is not None:
-                        if (0.3 <= SCR <= 0.75 and FAR <= 0.3):
-                            trace.append("0.3 ≤ SCR ≤ 0.75 and FAR ≤ 0.3 ⇒ LCZ-6")
-                            mark("lowrise_branch", "lcz6", "SCR/FAR rule")
-                            return {"lcz":"6","trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":best_matches(params)}
-                        elif (0.1 <= SCR < 0.3 and FAR > 0.3):
-                            if params.get("PSF") is not None and float(params["PSF"]) < 10:
-                                trace.append("PSF < 10 ⇒ LCZ-8")
-                                mark("lowrise_branch", "lcz8", "PSF<10")
-                                return {"lcz":"8","trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":best_matches(params)}
-                            else:
-                                trace.append("PSF ≥ 10 ⇒ LCZ-8B")
-                                mark("lowrise_branch", "lcz8B", "PSF≥10")
-                                return {"lcz":"8B","trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":best_matches(params)}
-                        else:
-                            winner = best_matches(params, ["6","8","8B"], topk=3)
-                            mark("lowrise_branch", f"lcz{winner[0][0]}", "best-match")
-                            return {"lcz":winner[0][0],"trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":winner}
-                    else:
-                        winner = best_matches(params, ["6","8","8B"], topk=3)
-                        mark("lowrise_branch", f"lcz{winner[0][0]}", "best-match (SCR/FAR missing)")
-                        return {"lcz":winner[0][0],"trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":winner}
-            else:
-                winner = best_matches(params, ["4","5","6","8","8B"], topk=3)
-                mark("bsf20to40", f"lcz{winner[0][0]}", "best-match (BH missing)")
-                return {"lcz":winner[0][0],"trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":winner}
-            
+            winner = best_matches(fp, ["6","8","8B"], topk=3)
+            mark("lowrise_branch", f"lcz{winner[0][0]}", "best-match (SCR/FAR missing)")
+            return {"lcz":winner[0][0],"trace":trace,"nodes":list(nodes), "edges":edges, "alternatives":winner}
+
     else:
         trace.append("Land-cover branch (BSF <10 and ISF <10)")
         mark("start", "land", "BSF<10 & ISF<10")
 
 
-        TR = to_num(params.get("TR"))
-        AL = to_num(params.get("AL"))
-        TH = params.get("TH")
+        TR = None if math.isnan(fp.TR) else fp.TR
+        AL = None if math.isnan(fp.AL) else fp.AL
+        TH = fp.TH
 
 
         code, reason = infer_lcz_from_TH(TH)
@@ -597,7 +623,7 @@ def classify_flow(params: Dict[str, Any]):
             trace.append(reason)
             mark("land", f"lcz{code}", "TH rule")
             return {"lcz": code, "trace": trace, "nodes": list(nodes), "edges": edges,
-                    "alternatives": best_matches(params, ["A","B","C","D","G"], topk=3)}
+                    "alternatives": best_matches(fp, ["A","B","C","D","G"], topk=3)}
 
 
         code, reason = infer_lcz_from_TR(TR)
@@ -609,61 +635,58 @@ def classify_flow(params: Dict[str, Any]):
             trace.append(reason)
             mark("land", f"lcz{code}", "TR rule")
             return {"lcz": code, "trace": trace, "nodes": list(nodes), "edges": edges,
-                    "alternatives": best_matches(params, ["A","B","C","D","G"], topk=3)}
+                    "alternatives": best_matches(fp, ["A","B","C","D","G"], topk=3)}
 
 
         if AL is not None and 0.02 <= AL <= 0.10:
             trace.append(f"AL={AL} within 0.02–0.10 (water-like) ⇒ LCZ-G")
             mark("land", "lczG", "AL rule")
             return {"lcz": "G", "trace": trace, "nodes": list(nodes), "edges": edges,
-                    "alternatives": best_matches(params, ["A","B","C","D"], topk=3)}
+                    "alternatives": best_matches(fp, ["A","B","C","D"], topk=3)}
 
 
         candidates = ["A","B","C","D","G"]
-        winner = best_matches(params, candidates, topk=3)
+        winner = best_matches(fp, candidates, topk=3)
         trace.append("Insufficient TH/TR/AL — fell back to land-cover table scoring.")
         mark("land", f"lcz{winner[0][0]}", "table fallback")
         return {"lcz": winner[0][0], "trace": trace, "nodes": list(nodes), "edges": edges,
                 "alternatives": winner}
 
 
-def to_dot(nodes: List[str], edges: List[Tuple[str,str,str]], final_label: str):
+DOT_LABELS = {
+    "start":"LCZ parameters",
+    "built":"Built-up branch",
+    "lcz9":"LCZ-9",
+    "bsf40":"BSF ≥ 40%",
+    "midrise123435":"10 ≤ BH < 25 → {2,34,35}",
+    "lcz1":"LCZ-1",
+    "lcz3":"LCZ-3",
+    "bsf20to40":"20% ≤ BSF < 40%",
+    "lcz4":"LCZ-4",
+    "lcz5":"LCZ-5",
+    "lowrise_branch":"BH < 10 → (SCR/FAR)",
+    "lcz6":"LCZ-6",
+    "lcz8":"LCZ-8",
+    "lcz8B":"LCZ-8B",
+    "land":"Land-cover branch",
+    "lczA":"LCZ-A",
+    "lczB":"LCZ-B",
+    "lczC":"LCZ-C",
+    "lczD":"LCZ-D",
+    "lczG":"LCZ-G",
+}
 
-    label_map = {
-        "start":"LCZ parameters",
-        "built":"Built-up branch",
-        "lcz9":"LCZ-9",
-        "bsf40":"BSF ≥ 40%",
-        "midrise123435":"10 ≤ BH < 25 → {2,34,35}",
-        "lcz1":"LCZ-1",
-        "lcz3":"LCZ-3",
-        "bsf20to40":"20% ≤ BSF < 40%",
-        "lcz4":"LCZ-4",
-        "lcz5":"LCZ-5",
-        "lowrise_branch":"BH < 10 → (SCR/FAR)",
-        "lcz6":"LCZ-6",
-        "lcz8":"LCZ-8",
-        "lcz8B":"LCZ-8B",
-        "land":"Land-cover branch",
-        "lczA":"LCZ-A",
-        "lczB":"LCZ-B",
-        "lczC":"LCZ-C",
-        "lczD":"LCZ-D",
-        "lczG":"LCZ-G",
-    }
+def _fill(n: str, final_label: str) -> str:
+    if not n.startswith("lcz"):
+        return "#f2f2f2"
+    return "#c8f7c5" if n == f"lcz{final_label}" else "#ffe0b2"
 
-    dot = ['digraph G { rankdir=LR; node [shape=box, style="rounded,filled", fillcolor="#f2f2f2"]; edge [fontsize=10];']
-    for n in nodes:
-        lab = label_map.get(n, n)
-        fill = "#c8f7c5" if lab.endswith(final_label) or n.startswith("lcz") and lab.endswith(final_label) else "#f2f2f2"
-        if n.startswith("lcz"):
-            fill = "#c8f7c5" if lab.endswith(final_label) else "#ffe0b2"
-        dot.append(f'"{n}" [label="{lab}", fillcolor="{fill}"];')
-    for a,b,lbl in edges:
-        style = "bold" if b.startswith("lcz") else "solid"
-        dot.append(f'"{a}" -> "{b}" [label="{lbl}", penwidth=2, style={style}];')
-    dot.append("}")
-    return "\n".join(dot)
+def to_dot(nodes: List[str], edges: List[Tuple[str,str,str]], final_label: str):
+    header = 'digraph G { rankdir=LR; node [shape=box, style="rounded,filled", fillcolor="#f2f2f2"]; edge [fontsize=10];'
+    node_lines = (f'"{n}" [label="{DOT_LABELS.get(n, n)}", fillcolor="{_fill(n, final_label)}"];' for n in nodes)
+    edge_lines = (f'"{a}" -> "{b}" [label="{lbl}", penwidth=2, style={"bold" if b.startswith("lcz") else "solid"}];'
+                  for a, b, lbl in edges)
+    return "\n".join(chain([header], node_lines, edge_lines, ["}"]))
 
 
 
@@ -678,6 +701,10 @@ def _lcz_sort_key(code: str):
     except ValueError:
         return (1, code)
 
+def _on_preset_change():
+    preset = sys.intern(st.session_state.preset_lcz)
+    if preset != "— choose —":
+        apply_preset_to_session(preset)
 
 
 with st.sidebar:
@@ -685,13 +712,7 @@ with st.sidebar:
     init_defaults()
 
     preset_options = ["— choose —"] + sorted(list(LCZ_TABLE.keys()), key=_lcz_sort_key)
-    preset = st.selectbox("LCZ preset", options=preset_options, key="preset_lcz")
-
-    if preset != "— choose —":
-        if st.session_state.get("_last_preset") != preset:
-            apply_preset_to_session(preset)
-            st.session_state["_last_preset"] = preset
-            st.rerun()
+    st.selectbox("LCZ preset", options=preset_options, key="preset_lcz", on_change=_on_preset_change)
 
     SVF = st.number_input("SVF", min_value=0.0, max_value=1.0, step=0.01, key="SVF")
     st.caption("min = 0, max = 1")
@@ -721,8 +742,7 @@ with st.sidebar:
 
 
 
-params = {p: st.session_state.get(p) for p in
-          ["SVF","SCR","FAR","BSF","ISF","PSF","BH","BHD","BHV","AL","TR","TH"]}
+params = FrozenParams.from_mapping(st.session_state)
 
 
 
@@ -734,438 +754,438 @@ nodes = res["nodes"]
 edges = res["edges"]
 alts = res["alternatives"]
 
-PARAM_ORDER = ["SVF","SCR","FAR","BSF","ISF","PSF","BH","BHD","BHV","AL","TH","TR"]
 
 def _lcz_group(code: str) -> str:
     return "Built-up" if code and code[0].isdigit() else "Land cover"
 
-def _ranges_df(ranges_dict: dict) -> pd.DataFrame:
-    data = []
-    for p in PARAM_ORDER:
-        v = None if ranges_dict is None else ranges_dict.get(p, "")
-        data.append({"Parameter": p, "Range": v if v is not None else ""})
-    return pd.DataFrame(data)
+PARAM_ORDER = ["SVF","SCR","FAR","BSF","ISF","PSF","BH","BHD","BHV","AL","TH","TR"]
+
+def _ranges_df(ranges_dict: dict) -> "pd.DataFrame":
+    import pandas as pd
+    rd = ranges_dict or {}
+    return pd.DataFrame({"Parameter": PARAM_ORDER, "Range": [rd.get(p) or "" for p in PARAM_ORDER]})
 
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Classifier", "LCZs", "Parameters", "GIS vs WUDAPT", "District Level", "Comparison"])
+def _defs_df(items: List[dict]) -> "pd.DataFrame":
+    import pandas as pd
+    return pd.DataFrame(items, columns=["code","type","group","definition","image"])
+
+@st.cache_resource
+def _build_lcz_catalog() -> List[dict]:
+    import pyarrow as pa
+    summary_map = _summary_df()[["Meteorology","Social"]].to_dict(orient="index")
+    items = []
+    for code, meta in LCZ_DEFINITIONS.items():
+        it = {
+            "code": str(code),
+            "type": meta.get("type","").strip(),
+            "definition": meta.get("definition","").strip(),
+            "implications": summary_map.get(code),
+            "group": _lcz_group(str(code)),
+            "image": LCZ_IMAGES.get(str(code)),
+            "ranges_df": _ranges_df(LCZ_TABLE.get(code, {})),
+        }
+        # st.dataframe serializes Arrow directly, skipping the pandas conversion
+        it["ranges_arrow"] = pa.Table.from_pandas(it["ranges_df"], preserve_index=False)
+        it["_hay"] = f"{it['code']} {it['type']} {it['definition']}".lower()
+        items.append(it)
+    return sorted(items, key=lambda x: _lcz_sort_key(x["code"]))
+
+keep_tab_widget_state()
+tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(
+    ["Classifier", "LCZs", "Parameters", "GIS vs WUDAPT", "District Level", "Comparison"],
+    key="main_tab", on_change="rerun",
+)
 
 with tab1:
-    col1, col2 = st.columns([1,1])
+    if tab1.open:
+        col1, col2 = st.columns([1,1])
 
-    with col1:
-        st.subheader(f"Result: **LCZ-{lcz}**")
-        st.write(f"**Type:** {res.get('type','')}")
-        st.info(res.get("definition",""))
-        st.write("**Decision trace:**")
-        for t in trace:
-            st.markdown(f"- {t}")
-        #st.code(json.dumps(params, indent=2), language="json")
+        with col1:
+            st.subheader(f"Result: **LCZ-{lcz}**")
+            st.write(f"**Type:** {res.get('type','')}")
+            st.info(res.get("definition",""))
+            st.write("**Decision trace:**")
+            for t in trace:
+                st.markdown(f"- {t}")
+            #st.code(json.dumps(params, indent=2), language="json")
 
 
-    with col2:
+        with col2:
 
-        if res["image"]:
-            if res["image"].startswith("http"):
-                st.image(res["image"], caption=f"Example for LCZ-{lcz}", use_container_width=True)
-            else:
-                st.image(res["image"], caption=f"Example for LCZ-{lcz}", use_container_width=True)
+            if res["image"]:
+                if res["image"].startswith("http"):
+                    st.image(res["image"], caption=f"Example for LCZ-{lcz}", use_container_width=True)
+                else:
+                    st.image(_load_lcz_image(res["image"]), caption=f"Example for LCZ-{lcz}", use_container_width=True, output_format="PNG")
 
-        st.subheader("Alternative matches")
-        if alts:
-            alt_rows = [{"LCZ": a[0], "Hits": a[1], "Distance": round(a[2], 3)} for a in alts]
-            st.table(alt_rows)
-        else:
-            st.write("No alternatives found.")
+            st.subheader("Alternative matches")
+            if alts:
+                alt_rows = [{"LCZ": a[0], "Hits": a[1], "Distance": round(a[2], 3)} for a in alts]
+                st.table(alt_rows)
+            else:
+                st.write("No alternatives found.")
 
-    st.subheader("Decision Path Visualization")
-    dot = to_dot(nodes, edges, final_label=lcz)
-    st.graphviz_chart(dot, use_container_width=True)
+        st.subheader("Decision Path Visualization")
+        dot = to_dot(nodes, edges, final_label=lcz)
+        st.graphviz_chart(dot, use_container_width=True)
 
 
 with tab2:
-    st.header("LCZ info")
-
-    if "LCZ_DEFINITIONS" not in globals() or not isinstance(LCZ_DEFINITIONS, dict) or len(LCZ_DEFINITIONS) == 0:
-        st.warning("`LCZ_DEFINITIONS` not found or empty. Define it before using this tab.")
-        st.stop()
-
-    images_dict = globals().get("LCZ_IMAGES", {})
-
-    colc1, colc2, colc3, colc4 = st.columns([1.2, 1, 1, 1])
-    with colc1:
-        q = st.text_input("Search (code, type, text)", "")
-    with colc2:
-        group_filter = st.multiselect(
-            "Group",
-            ["Built-up", "Land cover", "All"],
-            default=["All"]
-        )
-    with colc3:
-        show_images = st.checkbox("Show images (if available)", value=True)
-    with colc4:
-        compact = st.checkbox("Compact tables", value=True, help="Smaller font & height for ranges table")
-
-    st.divider()
-    df_summary = pd.DataFrame(LCZ_SUMMARY).set_index("LCZ")
+    if tab2.open:
+        st.header("LCZ info")
+
+        if "LCZ_DEFINITIONS" not in globals() or not isinstance(LCZ_DEFINITIONS, dict) or len(LCZ_DEFINITIONS) == 0:
+            st.warning("`LCZ_DEFINITIONS` not found or empty. Define it before using this tab.")
+            st.stop()
+
+        colc1, colc2, colc3, colc4 = st.columns([1.2, 1, 1, 1])
+        with colc1:
+            q = st.text_input("Search (code, type, text)", key="lcz_query")
+        with colc2:
+            group_filter = st.multiselect(
+                "Group",
+                ["Built-up", "Land cover", "All"],
+                key="lcz_groups"
+            )
+        with colc3:
+            show_images = st.checkbox("Show images (if available)", key="lcz_show_images")
+        with colc4:
+            compact = st.checkbox("Compact tables", key="lcz_compact", help="Smaller font & height for ranges table")
 
-    items = []
-    for code, meta in LCZ_DEFINITIONS.items():
-        implications = None
-        if code in df_summary.index:
-            row = df_summary.loc[code]
-            implications = {
-                "Meteorology": row["Meteorology"],
-                "Social": row["Social"]
-            }        
-
-        items.append({
-            "code": str(code),
-            "type": meta.get("type","").strip(),
-            "definition": meta.get("definition","").strip(),
-            "implications": implications,
-            "group": _lcz_group(str(code)),
-            "image": images_dict.get(str(code)),
-            "ranges": LCZ_TABLE.get(code, {})
-        })
-
-    q_lower = q.lower().strip()
-    filtered = []
-    all = []
-    for it in items:
-        if q_lower:
-            hay = f"{it['code']} {it['type']} {it['definition']}".lower()
-            if q_lower not in hay:
+        st.divider()
+        items = _build_lcz_catalog()
+
+        q_lower = q.lower().strip()
+        group_set = set(group_filter)
+        include_all = "All" in group_set
+        filtered = []
+        all_items = []
+        for it in items:
+            if q_lower and q_lower not in it["_hay"]:
                 continue
-        all.append(it)
-        if it["group"] not in group_filter:
-            continue
-        if q_lower:
-            hay = f"{it['code']} {it['type']} {it['definition']}".lower()
-            if q_lower not in hay:
+            all_items.append(it)
+            if not include_all and it["group"] not in group_set:
                 continue
-        filtered.append(it)
-
-
-    filtered = sorted(filtered, key=lambda x: _lcz_sort_key(x["code"]))
-    all = sorted(all, key=lambda x: _lcz_sort_key(x["code"]))
-
-    total = len(filtered)
-    built = sum(1 for x in filtered if x["group"] == "Built-up")
-    land  = total - built
-    st.caption(f"Showing {total} LCZs — {built} built-up, {land} land cover")
-
-    if not filtered:
-        cols = st.columns(3)
-        for i, it in enumerate(all):
-            with cols[i % 3]:
-                st.markdown(f"### LCZ-{it['code']}")
-                st.markdown(f"**Type:** {it['type']}")
-                if show_images and it["image"]:
-                    st.image(it["image"], use_container_width=True, caption=f"Example — LCZ-{it['code']}")
-                st.markdown(it["definition"] or "_No definition provided._")
-
-                if it["implications"]:
-                    st.markdown("**Meteorological Impact:**")
-                    st.write(it["implications"]["Meteorology"])
-                    st.markdown("**Social Impact:**")
-                    st.write(it["implications"]["Social"])
-
-
-                # Ranges table
-                df_ranges = _ranges_df(it["ranges"])
-                if compact:
-                    st.dataframe(
-                        df_ranges,
-                        use_container_width=True,
-                        height=280,
-                        hide_index=True
-                    )
-                else:
-                    st.table(df_ranges)
+            filtered.append(it)
+
+
+        total = len(filtered)
+        built = sum(1 for x in filtered if x["group"] == "Built-up")
+        land  = total - built
+        st.caption(f"Showing {total} LCZs — {built} built-up, {land} land cover")
+
+        if not filtered:
+            cols = st.columns(3)
+            for i, it in enumerate(all_items):
+                with cols[i % 3]:
+                    st.markdown(f"### LCZ-{it['code']}")
+                    st.markdown(f"**Type:** {it['type']}")
+                    if show_images and it["image"]:
+                        st.image(_load_lcz_image(it["image"]), use_container_width=True, caption=f"Example — LCZ-{it['code']}", output_format="PNG")
+                    st.markdown(it["definition"] or "_No definition provided._")
+
+                    if it["implications"]:
+                        st.markdown("**Meteorological Impact:**")
+                        st.write(it["implications"]["Meteorology"])
+                        st.markdown("**Social Impact:**")
+                        st.write(it["implications"]["Social"])
+
+
+                    # Ranges table
+                    if compact:
+                        st.dataframe(
+                            it["ranges_arrow"],
+                            use_container_width=True,
+                            height=280,
+                            hide_index=True
+                        )
+                    else:
+                        st.table(it["ranges_df"])
 
-    else:
-        cols = st.columns(3)
-        for i, it in enumerate(filtered):
-            with cols[i % 3]:
-                st.markdown(f"### LCZ-{it['code']}")
-                st.markdown(f"**Type:** {it['type']}")
-                if show_images and it["image"]:
-                    st.image(it["image"], use_container_width=True, caption=f"Example — LCZ-{it['code']}")
-                st.markdown(it["definition"] or "_No definition provided._")
-                #with st.expander("More"):
-                #    st.write(f"Group: `{it['group']}`")
-                #    if it["image"]:
-                #        st.write(f"Image path/URL: `{it['image']}`")
-                # Ranges table
-
-                if it["implications"]:
-                    st.markdown("**Meteorological Impact:**")
-                    st.write(it["implications"]["Meteorology"])
-                    st.markdown("**Social Impact:**")
-                    st.write(it["implications"]["Social"])
-
-
-                df_ranges = _ranges_df(it["ranges"])
-                if compact:
-                    st.dataframe(
-                        df_ranges,
-                        use_container_width=True,
-                        height=280,
-                        hide_index=True
-                    )
-                else:
-                    st.table(df_ranges)
+        else:
+            cols = st.columns(3)
+            for i, it in enumerate(filtered):
+                with cols[i % 3]:
+                    st.markdown(f"### LCZ-{it['code']}")
+                    st.markdown(f"**Type:** {it['type']}")
+                    if show_images and it["image"]:
+                        st.image(_load_lcz_image(it["image"]), use_container_width=True, caption=f"Example — LCZ-{it['code']}", output_format="PNG")
+                    st.markdown(it["definition"] or "_No definition provided._")
+                    #with st.expander("More"):
+                    #    st.write(f"Group: `{it['group']}`")
+                    #    if it["image"]:
+                    #        st.write(f"Image path/URL: `{it['image']}`")
+                    # Ranges table
+
+                    if it["implications"]:
+                        st.markdown("**Meteorological Impact:**")
+                        st.write(it["implications"]["Meteorology"])
+                        st.markdown("**Social Impact:**")
+                        st.write(it["implications"]["Social"])
+
+
+                    if compact:
+                        st.dataframe(
+                            it["ranges_arrow"],
+                            use_container_width=True,
+                            height=280,
+                            hide_index=True
+                        )
+                    else:
+                        st.table(it["ranges_df"])
 
 
-    st.divider()
+        st.divider()
 
-    if st.checkbox("Show as table", value=False):
-        df_defs = pd.DataFrame(all)[["code","type","group","definition","image"]]
-        st.dataframe(df_defs, use_container_width=True)
-        csv = df_defs.to_csv(index=False).encode("utf-8")
-        st.download_button("Download CSV", data=csv, file_name="lcz_definitions_filtered.csv", mime="text/csv")
+        if st.checkbox("Show as table", key="lcz_show_table"):
+            df_defs = _defs_df(all_items)
+            st.dataframe(df_defs, use_container_width=True)
+            csv = df_defs.to_csv(index=False).encode("utf-8")
+            st.download_button("Download CSV", data=csv, file_name="lcz_definitions_filtered.csv", mime="text/csv")
 
 
 
 
 with tab3:
-    st.header("Parameters")
-
-    with st.expander("SVF (Sky View Factor)"):
-        st.markdown("""
-        **Definition**  
-        Fraction of the sky hemisphere visible from the ground (0 = blocked, 1 = open).
-        """)
-        st.latex(r"\psi_{SVF} = 1 - \sum_i \sin^2(\beta_i)\,\frac{\alpha_i}{360^\circ}")
-        st.markdown("""
-        **Calculation**  
-        - Divide horizon into slices 
-        - find maximum skyline angle βᵢ for each i
-        - Compute blocked fraction                    
-        - Subtract from 1 for visible-sky fraction.  
-
-        **Interpretation**  
-        - Low (<0.3): Dense tall buildings, little visible sky.  
-        - Medium (0.3–0.6): Moderate density.  
-        - High (>0.6): Open areas, suburbs, fields.
-        """)
-        st.image(os.path.join(CUR_DIR, "images", "parimages", "svf.png"), caption="Interpolated Sky View Factor", width=500)
-        st.markdown("""
-        **Result Interpretation**
-        SVF is lower in the eastern town (more of the core) than the west
-        Even though the core is mainly dense low-rise buildings, it sees a low SVF due to higher built area.
+    if tab3.open:
+        st.header("Parameters")
+
+        with st.expander("SVF (Sky View Factor)"):
+            st.markdown("""
+            **Definition**  
+            Fraction of the sky hemisphere visible from the ground (0 = blocked, 1 = open).
+            """)
+            st.latex(r"\psi_{SVF} = 1 - \sum_i \sin^2(\beta_i)\,\frac{\alpha_i}{360^\circ}")
+            st.markdown("""
+            **Calculation**  
+            - Divide horizon into slices 
+            - find maximum skyline angle βᵢ for each i
+            - Compute blocked fraction                    
+            - Subtract from 1 for visible-sky fraction.  
+
+            **Interpretation**  
+            - Low (<0.3): Dense tall buildings, little visible sky.  
+            - Medium (0.3–0.6): Moderate density.  
+            - High (>0.6): Open areas, suburbs, fields.
+            """)
+            st.image(os.path.join(CUR_DIR, "images", "parimages", "svf.png"), caption="Interpolated Sky View Factor", width=500)
+            st.markdown("""
+            **Result Interpretation**
+            SVF is lower in the eastern town (more of the core) than the west
+            Even though the core is mainly dense low-rise buildings, it sees a low SVF due to higher built area.
                     
-                    """)
-
-    with st.expander("SCR (Street Canyon Ratio)"):
-        st.markdown("**Definition**: Ratio of average building height (H) to average street width (W).")
-        st.latex(r"SCR = \frac{H}{W}")
-        st.markdown("""
-        **Calculation**  
-        - H = mean building height along street segment.  
-        - W = mean street width.  
-
-        **Interpretation**  
-        - <0.5: Wide streets, open canyons, good ventilation.  
-        - ≈1: Balanced canyons (H ≈ W).  
-        - \>2: Deep, narrow canyons, poor ventilation.
-        """)
-        st.image(os.path.join(CUR_DIR, "images", "parimages", "scr.png"), caption="Street Canyon Ratio", width=500)
-        st.markdown("""
-        **Result Interpretation**
-        There is about an equal distribution of street cannons
-        - About 40\% are shallow street cannons, 32\% standard, and 28\% deep cannons.
-        - Probably because Changsha often has really wide roads 
-                    """)
-
-    with st.expander("FAR (Floor Area Ratio)"):
-        st.markdown("**Definition**: Ratio of total building floor area to plot area.")
-        st.latex(r"FAR = \frac{\text{Total Floor Area}}{\text{Plot Area}}")
-        st.markdown("""
-        **Calculation**  
-        - Floor area = footprint × floors.  
-        - Divide by plot/grid cell area.  
-
-        **Interpretation**  
-        - <0.5: Low density (suburban/rural).  
-        - 0.5–2: Moderate density.  
-        - \>3: High-rise, very dense urban core.
-        """)
-        st.image(os.path.join(CUR_DIR, "images", "parimages", "far.png"), caption="Floor Area Ratio", width=500)
-
-    with st.expander("BSF (Building Surface Fraction)"):
-        st.markdown("**Definition**: Fraction of grid cell covered by building footprints.")
-        st.latex(r"BSF = \frac{\text{Building Footprint Area}}{\text{Grid Cell Area}}")
-        st.markdown("""
-        **Calculation**  
-        - Building data collected during 2016, 2017 using Open Street Map    
-        - Sum builfing footprint area in grid cell and divide by cell area. 
-
-        **Interpretation**  
-        - <10%: Sparse development.  
-        - 20–40%: Moderate built-up.  
-        - \>50%: Dense compact zones (LCZ 1–3).
-        """)
-        st.image(os.path.join(CUR_DIR, "images", "parimages", "bsf2.png"), caption="Building Surface Fraction", width=500)
-        st.markdown("""
-        **Result Interpretation**
-        - The city center is really dense, but new developments, although tall, are pretty open
-        - Clear gradual decline from the city center
-        - Areas with high built area in the eastern side were concentrated south of the Liuyang river, which had a really high FAR area
+                        """)
+
+        with st.expander("SCR (Street Canyon Ratio)"):
+            st.markdown("**Definition**: Ratio of average building height (H) to average street width (W).")
+            st.latex(r"SCR = \frac{H}{W}")
+            st.markdown("""
+            **Calculation**  
+            - H = mean building height along street segment.  
+            - W = mean street width.  
+
+            **Interpretation**  
+            - <0.5: Wide streets, open canyons, good ventilation.  
+            - ≈1: Balanced canyons (H ≈ W).  
+            - \>2: Deep, narrow canyons, poor ventilation.
+            """)
+            st.image(os.path.join(CUR_DIR, "images", "parimages", "scr.png"), caption="Street Canyon Ratio", width=500)
+            st.markdown("""
+            **Result Interpretation**
+            There is about an equal distribution of street cannons
+            - About 40\% are shallow street cannons, 32\% standard, and 28\% deep cannons.
+            - Probably because Changsha often has really wide roads 
+                        """)
+
+        with st.expander("FAR (Floor Area Ratio)"):
+            st.markdown("**Definition**: Ratio of total building floor area to plot area.")
+            st.latex(r"FAR = \frac{\text{Total Floor Area}}{\text{Plot Area}}")
+            st.markdown("""
+            **Calculation**  
+            - Floor area = footprint × floors.  
+            - Divide by plot/grid cell area.  
+
+            **Interpretation**  
+            - <0.5: Low density (suburban/rural).  
+            - 0.5–2: Moderate density.  
+            - \>3: High-rise, very dense urban core.
+            """)
+            st.image(os.path.join(CUR_DIR, "images", "parimages", "far.png"), caption="Floor Area Ratio", width=500)
+
+        with st.expander("BSF (Building Surface Fraction)"):
+            st.markdown("**Definition**: Fraction of grid cell covered by building footprints.")
+            st.latex(r"BSF = \frac{\text{Building Footprint Area}}{\text{Grid Cell Area}}")
+            st.markdown("""
+            **Calculation**  
+            - Building data collected during 2016, 2017 using Open Street Map    
+            - Sum builfing footprint area in grid cell and divide by cell area. 
+
+            **Interpretation**  
+            - <10%: Sparse development.  
+            - 20–40%: Moderate built-up.  
+            - \>50%: Dense compact zones (LCZ 1–3).
+            """)
+            st.image(os.path.join(CUR_DIR, "images", "parimages", "bsf2.png"), caption="Building Surface Fraction", width=500)
+            st.markdown("""
+            **Result Interpretation**
+            - The city center is really dense, but new developments, although tall, are pretty open
+            - Clear gradual decline from the city center
+            - Areas with high built area in the eastern side were concentrated south of the Liuyang river, which had a really high FAR area
                     
-                    """)
-
-    with st.expander("ISF (Impervious Surface Fraction)"):
-        st.markdown("**Definition**: Fraction of area covered by impervious materials (roads, concrete, rooftops).")
-        st.latex(r"ISF = \frac{\text{Impervious Surface Area}}{\text{Grid Cell Area}}")
-        st.markdown("""
-        **Calculation**  
-        - Derived from remote sensing (Something complicated using NDVI and NDWI and supervised classification).  
-
-        **Interpretation**  
-        Bro I have been trying to understand what they exactly mean but the plot does not make sense. Even if i see it as the fraction of area thats impervious or what they mention in the paper as area of vegetation and water by total.
-        - <20%: Mostly natural cover.  
-        - 40–60%: Mixed cover.  
-        - \>70%: Heavily sealed urban core.
-        """)
-        st.image(os.path.join(CUR_DIR, "images", "parimages", "isf.png"), caption="Impervious Surface Fraction", width=500)
-        st.markdown("""
-        **Result Interpretation**
-        - Highly impervious regions were mainly the railway station, some markets, and industrian parks and economic zones.
-        - Which were like urban paved areas with car parks, buildings, and roads...
-        - Furong in the east had high density commecrial centers and residential land with high ISF
-                    """)
+                        """)
+
+        with st.expander("ISF (Impervious Surface Fraction)"):
+            st.markdown("**Definition**: Fraction of area covered by impervious materials (roads, concrete, rooftops).")
+            st.latex(r"ISF = \frac{\text{Impervious Surface Area}}{\text{Grid Cell Area}}")
+            st.markdown("""
+            **Calculation**  
+            - Derived from remote sensing (Something complicated using NDVI and NDWI and supervised classification).  
+
+            **Interpretation**  
+            Bro I have been trying to understand what they exactly mean but the plot does not make sense. Even if i see it as the fraction of area thats impervious or what they mention in the paper as area of vegetation and water by total.
+            - <20%: Mostly natural cover.  
+            - 40–60%: Mixed cover.  
+            - \>70%: Heavily sealed urban core.
+            """)
+            st.image(os.path.join(CUR_DIR, "images", "parimages", "isf.png"), caption="Impervious Surface Fraction", width=500)
+            st.markdown("""
+            **Result Interpretation**
+            - Highly impervious regions were mainly the railway station, some markets, and industrian parks and economic zones.
+            - Which were like urban paved areas with car parks, buildings, and roads...
+            - Furong in the east had high density commecrial centers and residential land with high ISF
+                        """)
         
-    with st.expander("PSF (Pervious Surface Fraction)"):
-        st.markdown("**Definition**: Fraction of grid cell covered by permeable ground (vegetation, soil).")
-        st.latex(r"PSF = \frac{\text{Pervious Surface Area}}{\text{Grid Cell Area}}")
-        st.markdown("""
-        **Calculation**  
-        - Typically = 1 − ISF (excluding water bodies).  
-        - Using vegetation indices (NDVI, NDWI).  
-
-        **Interpretation**  
-        - <20%: Dense urban cores.  
-        - 40–70%: Suburban/peri-urban.  
-        - \>80%: Natural/green LCZs.
+        with st.expander("PSF (Pervious Surface Fraction)"):
+            st.markdown("**Definition**: Fraction of grid cell covered by permeable ground (vegetation, soil).")
+            st.latex(r"PSF = \frac{\text{Pervious Surface Area}}{\text{Grid Cell Area}}")
+            st.markdown("""
+            **Calculation**  
+            - Typically = 1 − ISF (excluding water bodies).  
+            - Using vegetation indices (NDVI, NDWI).  
+
+            **Interpretation**  
+            - <20%: Dense urban cores.  
+            - 40–70%: Suburban/peri-urban.  
+            - \>80%: Natural/green LCZs.
                     
-        **Result Interpretation**
-        Areas with a lower population generally were more pervious, mostly in the western side of the city
-        """)
-        #st.image(f"{CUR_DIR}/images/parimages/ndvi.png", caption="NDVI", width=500)
-
-    with st.expander("BH (Mean Building Height)"):
-        st.markdown("**Definition**: Average building height in the grid.")
-        st.latex(r"BH = \frac{\sum_i h_i}{N}")
-        st.markdown("""
-        **Calculation**  
-        - Fisheye Cameras
-        - Building data collected during 2016, 2017 using Open Street Map  
-
-        **Interpretation**  
-        - <9 m: Low-rise zones.  
-        - 10–25 m: Mid-rise.  
-        - \>25 m: High-rise.
-        """)
-        st.image(os.path.join(CUR_DIR, "images", "parimages", "bh.png"), caption="Building Heights", width=500)
-        st.markdown("""
-        **Result Interpretation**
-        - Building heights gradually decrease from city center to the surrounding areas.
-        - Central areas east of the river have a large area of mid-rise buildings
-        - However Kaifu and Yuhua districts have the majority of high rise buildings
-                    """)
-
-    with st.expander("BHD (Building Height Deviation)"):
-        st.markdown("**Definition**: Mean absolute deviation of building heights within the grid (m).")
-        st.latex(r"\text{BHD} = \frac{1}{N}\sum_{i=1}^{N} \left| h_i - \overline{h} \right|")
-        st.markdown("""
-        **Calculation**
-        - $h_i$: height of building $i$;  $\overline{h}$: mean height.
-        - Building data collected during 2016, 2017 using Open Street Map 
+            **Result Interpretation**
+            Areas with a lower population generally were more pervious, mostly in the western side of the city
+            """)
+            #st.image(f"{CUR_DIR}/images/parimages/ndvi.png", caption="NDVI", width=500)
+
+        with st.expander("BH (Mean Building Height)"):
+            st.markdown("**Definition**: Average building height in the grid.")
+            st.latex(r"BH = \frac{\sum_i h_i}{N}")
+            st.markdown("""
+            **Calculation**  
+            - Fisheye Cameras
+            - Building data collected during 2016, 2017 using Open Street Map  
+
+            **Interpretation**  
+            - <9 m: Low-rise zones.  
+            - 10–25 m: Mid-rise.  
+            - \>25 m: High-rise.
+            """)
+            st.image(os.path.join(CUR_DIR, "images", "parimages", "bh.png"), caption="Building Heights", width=500)
+            st.markdown("""
+            **Result Interpretation**
+            - Building heights gradually decrease from city center to the surrounding areas.
+            - Central areas east of the river have a large area of mid-rise buildings
+            - However Kaifu and Yuhua districts have the majority of high rise buildings
+                        """)
+
+        with st.expander("BHD (Building Height Deviation)"):
+            st.markdown("**Definition**: Mean absolute deviation of building heights within the grid (m).")
+            st.latex(r"\text{BHD} = \frac{1}{N}\sum_{i=1}^{N} \left| h_i - \overline{h} \right|")
+            st.markdown("""
+            **Calculation**
+            - $h_i$: height of building $i$;  $\overline{h}$: mean height.
+            - Building data collected during 2016, 2017 using Open Street Map 
                     
-        **Interpretation**
-        - Low BHD → more uniform roofline; High BHD → mixed/irregular heights.
-        """)
-        st.image(os.path.join(CUR_DIR, "images", "parimages", "bhd.png"), caption="Building Height Deviation", width=500)
-        st.markdown("""
-        **Result Interpretation**
-        The suburbs have high BHV and BHD due to new high rise residential areas around the original scattered low rise buildings. 
-                   """)
-
-    with st.expander("BHV (Building Height Variance)"):
-        st.markdown("**Definition**: Variance of building heights within the grid (m²).")
-        st.latex(r"\text{BHV} = \frac{1}{N}\sum_{i=1}^{N} \left(h_i - \overline{h}\right)^2")
-        st.markdown("""
-        **Calculation**
-        - Building data collected during 2016, 2017 using Open Street Map 
+            **Interpretation**
+            - Low BHD → more uniform roofline; High BHD → mixed/irregular heights.
+            """)
+            st.image(os.path.join(CUR_DIR, "images", "parimages", "bhd.png"), caption="Building Height Deviation", width=500)
+            st.markdown("""
+            **Result Interpretation**
+            The suburbs have high BHV and BHD due to new high rise residential areas around the original scattered low rise buildings. 
+                       """)
+
+        with st.expander("BHV (Building Height Variance)"):
+            st.markdown("**Definition**: Variance of building heights within the grid (m²).")
+            st.latex(r"\text{BHV} = \frac{1}{N}\sum_{i=1}^{N} \left(h_i - \overline{h}\right)^2")
+            st.markdown("""
+            **Calculation**
+            - Building data collected during 2016, 2017 using Open Street Map 
                     
-        **Interpretation**
-        - High BHV indicates strong mixing of low- and high-rise buildings.
-        """)
-        st.image(os.path.join(CUR_DIR, "images", "parimages", "bhv.png"), caption="Building Height Deviation", width=500)
-        st.markdown("""
-        **Result Interpretation**
-        The suburbs have high BHV and BHD due to new high rise residential areas around the original scattered low rise buildings. 
-                   """)
-
-    with st.expander("AL (Albedo)"):
-        st.markdown("**Definition**: Surface reflectivity (ratio of reflected to incoming shortwave radiation).")
-        st.latex(r"Albedo = \frac{R_{SW}^{\uparrow}}{R_{SW}^{\downarrow}}")
-        st.markdown("""
-        **Calculation**  
-        - Derived from remote sensing data (They used Landsat 8)
-
-        **Interpretation**  
-        - 0.05–0.15: Asphalt, dark roofs.  
-        - 0.15–0.3: Concrete, stone.  
-        - \>0.3: Bright reflective roofs/surfaces.
-        """)
-        st.image(os.path.join(CUR_DIR, "images", "parimages", "al.png"), caption="Albedo", width=500)
-        st.markdown("""
-        **Result Interpretation**
-        Albedo was generally higher in the newly developed regions
-        - Probably because of glass buildings 
-                   """)
-
-    with st.expander("TR (Terrain Roughness)"):
-        st.markdown("""
-        **Definition**  
-        Measure of aerodynamic drag caused by surface obstacles (buildings, vegetation).  
-        Usually parameterized as a roughness length (z₀).
-        8 levels from the smooth sea to chaotic.
-        The sea will have a roughness length of 0.0002m, vs large obstacles in urban areas would have a roughness length of >2m.
-        (z₀) represents the physical effect of surface obstacles on the wind velocity profile. 
-        """)
-        st.markdown("**Calculation**: Based on building height/spacing distribution. They've used supervised classification for Davenport's 2000 methodology and I do not have access to that paper.")
-        st.markdown("""
-        **Interpretation**  
-        - 8: Dense urban core, Large Forest.  
-        - 5–6: Suburban or tree-dominated.  
-        - 3–4: Low vegetation/open land.  
-        - 1: Water, very smooth.
-        """)
-        st.image(os.path.join(CUR_DIR, "images", "parimages", "tr.png"), caption="Terrain Roughness", width=500)
-
-    with st.expander("TH (Tree / Cover Type)"):
-        st.markdown("""
-        **Definition**  
-        Vegetation/cover type (dense trees, scattered trees, shrubs, ground cover, water).
-        """)
-        st.markdown("**Calculation**: Remote sensing classification (NDVI and NDWI). Supervised Classification")
-        st.markdown("""
-        **Interpretation**  
-        - Dense trees → LCZ-A  
-        - Scattered trees → LCZ-B  
-        - Bush/scrub → LCZ-C  
-        - Low plants/grass → LCZ-D  
-        - Bare rock/soil/water → LCZ-E/F/G
-        """)
-
-        st.image(os.path.join(CUR_DIR, "images", "parimages", "th.png"), caption="Tree Categorisation", width=500)
-        st.markdown("""
-        **Result Interpretation**
-        Most land cover was dominated by Dense forests and Open ground
-        - Dense forests were about 16\% of total, while open ground was ~27
-                   """)
+            **Interpretation**
+            - High BHV indicates strong mixing of low- and high-rise buildings.
+            """)
+            st.image(os.path.join(CUR_DIR, "images", "parimages", "bhv.png"), caption="Building Height Deviation", width=500)
+            st.markdown("""
+            **Result Interpretation**
+            The suburbs have high BHV and BHD due to new high rise residential areas around the original scattered low rise buildings. 
+                       """)
+
+        with st.expander("AL (Albedo)"):
+            st.markdown("**Definition**: Surface reflectivity (ratio of reflected to incoming shortwave radiation).")
+            st.latex(r"Albedo = \frac{R_{SW}^{\uparrow}}{R_{SW}^{\downarrow}}")
+            st.markdown("""
+            **Calculation**  
+            - Derived from remote sensing data (They used Landsat 8)
+
+            **Interpretation**  
+            - 0.05–0.15: Asphalt, dark roofs.  
+            - 0.15–0.3: Concrete, stone.  
+            - \>0.3: Bright reflective roofs/surfaces.
+            """)
+            st.image(os.path.join(CUR_DIR, "images", "parimages", "al.png"), caption="Albedo", width=500)
+            st.markdown("""
+            **Result Interpretation**
+            Albedo was generally higher in the newly developed regions
+            - Probably because of glass buildings 
+                       """)
+
+        with st.expander("TR (Terrain Roughness)"):
+            st.markdown("""
+            **Definition**  
+            Measure of aerodynamic drag caused by surface obstacles (buildings, vegetation).  
+            Usually parameterized as a roughness length (z₀).
+            8 levels from the smooth sea to chaotic.
+            The sea will have a roughness length of 0.0002m, vs large obstacles in urban areas would have a roughness length of >2m.
+            (z₀) represents the physical effect of surface obstacles on the wind velocity profile. 
+            """)
+            st.markdown("**Calculation**: Based on building height/spacing distribution. They've used supervised classification for Davenport's 2000 methodology and I do not have access to that paper.")
+            st.markdown("""
+            **Interpretation**  
+            - 8: Dense urban core, Large Forest.  
+            - 5–6: Suburban or tree-dominated.  
+            - 3–4: Low vegetation/open land.  
+            - 1: Water, very smooth.
+            """)
+            st.image(os.path.join(CUR_DIR, "images", "parimages", "tr.png"), caption="Terrain Roughness", width=500)
+
+        with st.expander("TH (Tree / Cover Type)"):
+            st.markdown("""
+            **Definition**  
+            Vegetation/cover type (dense trees, scattered trees, shrubs, ground cover, water).
+            """)
+            st.markdown("**Calculation**: Remote sensing classification (NDVI and NDWI). Supervised Classification")
+            st.markdown("""
+            **Interpretation**  
+            - Dense trees → LCZ-A  
+            - Scattered trees → LCZ-B  
+            - Bush/scrub → LCZ-C  
+            - Low plants/grass → LCZ-D  
+            - Bare rock/soil/water → LCZ-E/F/G
+            """)
+
+            st.image(os.path.join(CUR_DIR, "images", "parimages", "th.png"), caption="Tree Categorisation", width=500)
+            st.markdown("""
+            **Result Interpretation**
+            Most land cover was dominated by Dense forests and Open ground
+            - Dense forests were about 16\% of total, while open ground was ~27
+                       """)
 
 PLOTS_DIR = os.path.join(CUR_DIR, "images", "plots")
 SUFFIXES = {
@@ -1176,127 +1196,163 @@ SUFFIXES = {
     "UA & PA": "_uapa_grouped.png",
 }
 
+PLOT_SUFFIXES = tuple(SUFFIXES.values())
+
+@st.cache_data(ttl=60)
 def find_districts_from_files(folder=PLOTS_DIR):
     if not os.path.isdir(folder):
         return []
     names = set()
     for fn in os.listdir(folder):
-        if not fn.lower().endswith(".png"):
-            continue
-        for suf in SUFFIXES.values():
+        for suf in PLOT_SUFFIXES:
             if fn.endswith(suf):
                 names.add(fn[: -len(suf)])
+                break
     return sorted(names)
 
-def load_image(path):
+@st.cache_data(ttl=60)
+def _existing_pngs(folder):
+    # file name -> mtime, so thumbnails can key the decode cache without a stat
+    if not os.path.isdir(folder):
+        return {}
+    with os.scandir(folder) as entries:
+        return {e.name: e.stat().st_mtime for e in entries}
+
+def _plot_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+@st.cache_resource(max_entries=64)
+def _decode_png(path, mtime):
+    # mtime is part of the cache key so a regenerated plot is decoded again;
+    # failures raise, so nothing is cached for a missing or broken file
+    from PIL import Image
+    img = Image.open(path)
+    img.load()
+    return img
+
+def load_image(path, mtime):
+    if mtime is None:
+        return None
     try:
-        return Image.open(path)
+        return _decode_png(path, mtime)
     except Exception:
         return None
 
+@st.cache_data(max_entries=64)
+def _png_bytes(path, mtime):
+    # mtime is part of the cache key so a regenerated plot is re-read
+    with open(path, "rb") as f:
+        return f.read()
+
 def show_image_with_download(title, path):
     st.markdown(f"**{title}**")
-    img = load_image(path)
+    mtime = _plot_mtime(path)
+    img = load_image(path, mtime)
     if img is None:
         st.warning(f"Missing: `{path}`")
         return
     st.image(img, width=900)
-    with open(path, "rb") as f:
-        st.download_button(
-            label=f"Download PNG: {os.path.basename(path)}",
-            data=f.read(),
-            file_name=os.path.basename(path),
-            mime="image/png",
-            key=path,  
-        )
+    st.download_button(
+        label=f"Download PNG: {os.path.basename(path)}",
+        data=_png_bytes(path, mtime),
+        file_name=os.path.basename(path),
+        mime="image/png",
+        key=path,  
+    )
 
 with tab4:
-    st.header("Overall GIS vs WUDAPT Comparison")
-
-    col1, col2 = st.columns(2)
-    with col1:
-        st.subheader("Final GIS based LCZ classification")
-        st.image(os.path.join(CUR_DIR, "images", "gislcz.png"), width=650, use_container_width=False)
-
-    with col2:
-        st.subheader("Final WUDAPT based LCZ classification")
-        st.image(os.path.join(CUR_DIR, "images", "WUDAPTlcz.png"), width=615, use_container_width=False)
-
-    st.divider()
-
-    # Summary text
-    st.markdown("""
-    WUDAPT had an overall accuracy of **58.72%** with a kappa coefficient of **0.54**  
-    (where -1 = complete disagreement, 0 = random chance, 1 = perfect agreement).  
-
-    GIS-based classification had an overall accuracy of **84.4%**.  
-
-    - WUDAPT tends to simplify complex and irregular urban structures. 
-    - Mainly classified urban areas are LCZ-5 
-    - Both are alright for a city scale to get the built area, land cover, and water classified right
-    - But the overall accuracy of GIS is better for district level classification
-
-    """)
-
+    if tab4.open:
+        st.header("Overall GIS vs WUDAPT Comparison")
 
-with tab5:
-    st.header("District Level")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("Final GIS based LCZ classification")
+            st.image(os.path.join(CUR_DIR, "images", "gislcz.png"), width=650, use_container_width=False)
 
-    districts = find_districts_from_files(PLOTS_DIR)
-    if not districts:
-        st.error(f"No PNGs found in `{PLOTS_DIR}/`. Expected files like `Yuelu_stacked_by_lcz.png`.")
-    else:
-        sel = st.selectbox("Select district", districts)
-
-        st.write("**Choose plots to display**")
-        cols = st.columns(2)
-        with cols[0]:
-            show_stacked_lcz = st.checkbox("Stacked by LCZ)", value=True)
-            show_stacked_group = st.checkbox("Stacked by Main LCZ group", value=True)
-            show_proportions = st.checkbox("Proportions", value=False)
-        with cols[1]:
-            show_uapa_grouped = st.checkbox("UA & PA", value=False)
-            show_overall_accuracy = st.checkbox("Overall Accuracy", value=False)
+        with col2:
+            st.subheader("Final WUDAPT based LCZ classification")
+            st.image(os.path.join(CUR_DIR, "images", "WUDAPTlcz.png"), width=615, use_container_width=False)
 
         st.divider()
 
-        if show_stacked_lcz:
-            p = os.path.join(PLOTS_DIR, f"{sel}{SUFFIXES['Stacked by LCZ']}")
-            show_image_with_download("Stacked by LCZ (per method)", p)
+        # Summary text
+        st.markdown("""
+        WUDAPT had an overall accuracy of **58.72%** with a kappa coefficient of **0.54**  
+        (where -1 = complete disagreement, 0 = random chance, 1 = perfect agreement).  
 
-        if show_stacked_group:
-            p = os.path.join(PLOTS_DIR, f"{sel}{SUFFIXES['Stacked by Main LCZ group']}")
-            show_image_with_download("Stacked by MainLCZ group", p)
+        GIS-based classification had an overall accuracy of **84.4%**.  
 
-        if show_proportions:
-            p = os.path.join(PLOTS_DIR, f"{sel}{SUFFIXES['Proportions']}")
-            show_image_with_download("Proportions", p)
+        - WUDAPT tends to simplify complex and irregular urban structures. 
+        - Mainly classified urban areas are LCZ-5 
+        - Both are alright for a city scale to get the built area, land cover, and water classified right
+        - But the overall accuracy of GIS is better for district level classification
 
-        if show_uapa_grouped:
-            p = os.path.join(PLOTS_DIR, f"{sel}{SUFFIXES['UA & PA']}")
-            show_image_with_download("UA & PA grouped", p)
+        """)
 
-        if show_overall_accuracy:
-            p = os.path.join(PLOTS_DIR, f"{sel}{SUFFIXES['Overall Accuracy']}")
-            show_image_with_download("Overall Accuracy", p)
 
+with tab5:
+    if tab5.open:
+        st.header("District Level")
 
-        with st.expander("See all available images for this district"):
-            thumbs = [
-                (label, os.path.join(PLOTS_DIR, f"{sel}{suf}"))
-                for label, suf in SUFFIXES.items()
-                if os.path.exists(os.path.join(PLOTS_DIR, f"{sel}{suf}"))
-            ]
-            if not thumbs:
-                st.info("No images found for this district.")
-            else:
-                ncols = min(3, len(thumbs))
-                grid = st.columns(ncols)
-                for i, (label, path) in enumerate(thumbs):
-                    with grid[i % ncols]:
-                        img = load_image(path)
-                        if img:
-                            st.image(img, caption=label, use_container_width=True)
+        districts = find_districts_from_files(PLOTS_DIR)
+        if not districts:
+            st.error(f"No PNGs found in `{PLOTS_DIR}/`. Expected files like `Yuelu_stacked_by_lcz.png`.")
+        else:
+            sel = st.selectbox("Select district", districts, key="district")
+
+            st.write("**Choose plots to display**")
+            cols = st.columns(2)
+            with cols[0]:
+                show_stacked_lcz = st.checkbox("Stacked by LCZ)", key="show_stacked_lcz")
+                show_stacked_group = st.checkbox("Stacked by Main LCZ group", key="show_stacked_group")
+                show_proportions = st.checkbox("Proportions", key="show_proportions")
+            with cols[1]:
+                show_uapa_grouped = st.checkbox("UA & PA", key="show_uapa_grouped")
+                show_overall_accuracy = st.checkbox("Overall Accuracy", key="show_overall_accuracy")
+
+            st.divider()
+
+            if show_stacked_lcz:
+                p = os.path.join(PLOTS_DIR, f"{sel}{SUFFIXES['Stacked by LCZ']}")
+                show_image_with_download("Stacked by LCZ (per method)", p)
+
+            if show_stacked_group:
+                p = os.path.join(PLOTS_DIR, f"{sel}{SUFFIXES['Stacked by Main LCZ group']}")
+                show_image_with_download("Stacked by MainLCZ group", p)
+
+            if show_proportions:
+                p = os.path.join(PLOTS_DIR, f"{sel}{SUFFIXES['Proportions']}")
+                show_image_with_download("Proportions", p)
+
+            if show_uapa_grouped:
+                p = os.path.join(PLOTS_DIR, f"{sel}{SUFFIXES['UA & PA']}")
+                show_image_with_download("UA & PA grouped", p)
+
+            if show_overall_accuracy:
+                p = os.path.join(PLOTS_DIR, f"{sel}{SUFFIXES['Overall Accuracy']}")
+                show_image_with_download("Overall Accuracy", p)
+
+
+            with st.expander("See all available images for this district"):
+                existing = _existing_pngs(PLOTS_DIR)
+                thumbs = [
+                    (label, os.path.join(PLOTS_DIR, f"{sel}{suf}"), existing[f"{sel}{suf}"])
+                    for label, suf in SUFFIXES.items()
+                    if f"{sel}{suf}" in existing
+                ]
+                if not thumbs:
+                    st.info("No images found for this district.")
+                else:
+                    ncols = min(3, len(thumbs))
+                    grid = st.columns(ncols)
+                    for i, (label, path, mtime) in enumerate(thumbs):
+                        with grid[i % ncols]:
+                            img = load_image(path, mtime)
+                            if img:
+                                st.image(img, caption=label, use_container_width=True)
 
  
 
@@ -1304,51 +1360,53 @@ with tab5:
 COMP_DIR = os.path.join(CUR_DIR, "images", "punevchangsha")
 
 with tab6:
-    st.header("City Comparison: Pune vs Changsha")
+    if tab6.open:
+        st.header("City Comparison: Pune vs Changsha")
 
-    st.markdown("""
-    ### Overview
-    The study area of Changsha here is about 352 km$^2$. It has a metro population of about 10 million. 99.2% of them are han chinese its crazy. \\
-    The study area of Pune here is about 243 km$^2$, although its now 516 (up from 331), with a metro population of ~7.4 million.
+        st.markdown("""
+        ### Overview
+        The study area of Changsha here is about 352 km$^2$. It has a metro population of about 10 million. 99.2% of them are han chinese its crazy. \\
+        The study area of Pune here is about 243 km$^2$, although its now 516 (up from 331), with a metro population of ~7.4 million.
                 
-    Despite having similar sizes, the GDP of Changsha is about 4 times higher at \$220 Billion.
-    Mao was lowkey radicalised in Changsha, and its a culturally important place for its western Han dynasty tombs. 
-
-    This tab compares LCZ classification outcomes for both cities.
-    """)
+        Despite having similar sizes, the GDP of Changsha is about 4 times higher at \$220 Billion.
+        Mao was lowkey radicalised in Changsha, and its a culturally important place for its western Han dynasty tombs. 
 
-    col1, col2 = st.columns(2)
-
-    with col1:
-        st.subheader("Pune Results")
-        pune_img = os.path.join(COMP_DIR, "punelcz.png")  
-        if os.path.exists(pune_img):
-            st.image(pune_img, caption="Pune WUDAPT LCZ Classification. Credit: Prasad Pathak", use_container_width=True)
-        else:
-            st.info("Pune comparison plot not found.")
-
-        st.markdown("""
-        - Pune mostly dominated by LCZ5, followed by open mid-rise
-        - Some open and bare area toward the north-eastern periphery (LCZ F)
-        - Lots of dense forests near the pashan and tekdi area
-        - But not many greenspacees within the built up regions
-        - About 82% accurate
+        This tab compares LCZ classification outcomes for both cities.
         """)
 
-    with col2:
-        st.subheader("Changsha Results")
-        changsha_img = os.path.join(COMP_DIR, "changshalcz.png")   
-        if os.path.exists(changsha_img):
-            st.image(changsha_img, caption="Changsha WUDAPT LCZ Classification", use_container_width=True)
-        else:
-            st.info("Changsha comparison plot not found.")
+        comp_files = _existing_pngs(COMP_DIR)
+        col1, col2 = st.columns(2)
 
-        st.markdown("""
-        - Most of the city area is still classified under non-built up land cover at 57%.
-        - LCZ5 was still the most common built up LCZ, but barely any open low-rise (LCZ 6)
-        - High rises mostly common around major roads and newly built areas. Same as viman nagar.
-        - Overall accuracy of (the map) about 58%. (but the text is from the high accuracy one)
-        """)
+        with col1:
+            st.subheader("Pune Results")
+            pune_img = os.path.join(COMP_DIR, "punelcz.png")  
+            if "punelcz.png" in comp_files:
+                st.image(pune_img, caption="Pune WUDAPT LCZ Classification. Credit: Prasad Pathak", use_container_width=True)
+            else:
+                st.info("Pune comparison plot not found.")
+
+            st.markdown("""
+            - Pune mostly dominated by LCZ5, followed by open mid-rise
+            - Some open and bare area toward the north-eastern periphery (LCZ F)
+            - Lots of dense forests near the pashan and tekdi area
+            - But not many greenspacees within the built up regions
+            - About 82% accurate
+            """)
+
+        with col2:
+            st.subheader("Changsha Results")
+            changsha_img = os.path.join(COMP_DIR, "changshalcz.png")   
+            if "changshalcz.png" in comp_files:
+                st.image(changsha_img, caption="Changsha WUDAPT LCZ Classification", use_container_width=True)
+            else:
+                st.info("Changsha comparison plot not found.")
+
+            st.markdown("""
+            - Most of the city area is still classified under non-built up land cover at 57%.
+            - LCZ5 was still the most common built up LCZ, but barely any open low-rise (LCZ 6)
+            - High rises mostly common around major roads and newly built areas. Same as viman nagar.
+            - Overall accuracy of (the map) about 58%. (but the text is from the high accuracy one)
+            """)
 
 
 